@@ -3,70 +3,266 @@
 """
 Minimal NIDS backend with authentication for frontend compatibility
 Windows-compatible with simple auth implementation
+
+Handler convention: endpoints are `async def` and must stay non-blocking
+(in-memory dict work and awaits only). Anything that does blocking I/O or
+heavy CPU work should be a plain `def` so FastAPI runs it in the threadpool.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import asyncio
+import functools
+import hashlib
+import hmac
+import logging
+import secrets
+import time
 import warnings
 import os
-from typing import Dict, Any
-import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+import orjson
+from pydantic import BaseModel, ConfigDict
+from typing_extensions import Annotated
 
-# Suppress warnings
-warnings.filterwarnings('ignore')
-os.environ['PYTHONWARNINGS'] = 'ignore'
+# Suppress warnings (PYTHONWARNINGS only takes effect at interpreter start; start-app.bat sets it)
+warnings.simplefilter('ignore')
 
 # Import minimal ML services
 from ml_services_minimal import get_ml_services, get_model_status
 
+# Plain-message INFO logging for this module only (DEBUG lines stay off)
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
 # --- Simple Authentication Setup ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Simple in-memory user for demo
 DEMO_USER = {
     "username": "admin",
-    "password": "admin123",
+    # SHA-256 digest of the demo password, stored as raw bytes
+    "hashed_password": hashlib.sha256(b"admin123").digest(),
     "full_name": "NIDS Administrator"
 }
 
 def authenticate_user(username: str, password: str):
-    """Simple authentication check"""
-    if username == DEMO_USER["username"] and password == DEMO_USER["password"]:
+    """Simple authentication check (constant-time comparison)"""
+    username_ok = hmac.compare_digest(username.encode(), DEMO_USER["username"].encode())
+    password_ok = hmac.compare_digest(hashlib.sha256(password.encode()).digest(), DEMO_USER["hashed_password"])
+    if username_ok and password_ok:
         return DEMO_USER
     return None
 
+# Token signing key, encoded to bytes once at import. Without NIDS_SECRET_KEY a random key is
+# generated per run and written back to the environment, so NIDS_WORKERS processes share it
+SECRET_KEY = os.environ.setdefault("NIDS_SECRET_KEY", secrets.token_hex(32))
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+
+# Tokens are valid for this long after login
+ACCESS_TOKEN_EXPIRE_SECONDS = 60 * 60
+
+def _token_signature(username: str, expires: str):
+    """HMAC-SHA256 over the username and expiry"""
+    return hmac.new(SECRET_KEY_BYTES, f"{username}_{expires}".encode(), hashlib.sha256).hexdigest()
+
 def create_access_token(username: str):
-    """Create a simple token (not JWT for simplicity)"""
-    return f"token_{username}_{hash(username + 'secret')}"
+    """Create a simple HMAC-SHA256 signed token with an expiry (not JWT for simplicity)"""
+    expires = str(int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS)
+    return f"token_{username}_{expires}_{_token_signature(username, expires)}"
+
+def verify_token(token: str):
+    """Return the user a token was issued to, or None if it is forged, malformed or expired"""
+    try:
+        prefix, expires, signature = token.rsplit("_", 2)
+        expires_at = int(expires)
+    except ValueError:
+        return None
+    if not prefix.startswith("token_"):
+        return None
+    username = prefix[len("token_"):]
+    expected = _token_signature(username, expires)
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
+        return None
+    if expires_at < time.time() or username != DEMO_USER["username"]:
+        return None
+    return DEMO_USER
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get current user from token"""
-    if token.startswith("token_admin_"):
-        return DEMO_USER
-    raise HTTPException(status_code=401, detail="Invalid authentication")
+    user = verify_token(token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+    return user
+
+# Reusable authenticated-user parameter type
+CurrentUser = Annotated[dict, Depends(get_current_user)]
+
+def _requires_user(dependant):
+    """Whether a route's dependency tree includes get_current_user"""
+    return any(dep.call is get_current_user or _requires_user(dep) for dep in dependant.dependencies)
+
+def protected_paths(routes):
+    """Paths of the routes that depend on get_current_user"""
+    # Templated paths ("/items/{id}") never equal a request path, so those routes are
+    # left to their get_current_user dependency alone
+    return frozenset(
+        route.path for route in routes
+        if isinstance(route, APIRoute) and _requires_user(route.dependant)
+    )
+
+class TokenAuthMiddleware:
+    """Pure ASGI guard that rejects bad tokens on protected paths before routing"""
+    
+    def __init__(self, app, routes):
+        self.app = app
+        # Starlette builds the middleware stack on the first request, after every route
+        # is registered, so the set always matches the routes' get_current_user dependencies
+        self.protected_paths = protected_paths(routes)
+        # Same bodies FastAPI would produce for a missing / wrong token, encoded once
+        self.missing_body = orjson.dumps({"detail": "Not authenticated"})
+        self.invalid_body = orjson.dumps({"detail": "Invalid authentication"})
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] not in self.protected_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value
+                break
+        
+        scheme, _, token = (authorization or b"").partition(b" ")
+        if scheme.lower() != b"bearer":
+            # No bearer credentials at all: what OAuth2PasswordBearer answers
+            body = self.missing_body
+            headers = [(b"www-authenticate", b"Bearer")]
+        elif verify_token(token.decode("latin-1")) is not None:
+            await self.app(scope, receive, send)
+            return
+        else:
+            # Bearer token that doesn't match: what get_current_user answers
+            body = self.invalid_body
+            headers = []
+        
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# --- Request / Response Models ---
+class PredictRequest(BaseModel):
+    """
+    Packet features for /api/ml/predict; unknown fields are passed through to the detector.
+    Numeric strings are coerced to numbers; non-numeric sizes or ports are rejected with 422.
+    """
+    model_config = ConfigDict(extra="allow")
+    
+    # The detector only compares these numerically, so fractional sizes are accepted too
+    packet_size: Optional[float] = None
+    packet_length: Optional[float] = None
+    protocol: Optional[str] = None
+    port: Optional[Union[int, float]] = None
+    dst_port: Optional[Union[int, float]] = None
+    src_ip: Optional[str] = None
+    time_delta: Optional[float] = None
+
+class Alert(BaseModel):
+    id: int
+    type: str
+    severity: str
+    message: str
+    timestamp: float
+
+class AlertsResponse(BaseModel):
+    alerts: List[Alert]
+    count: int
+    timestamp: float
+
+class GraphNode(BaseModel):
+    id: str
+    type: str
+    connections: int
+    label: str
+
+class GraphEdge(BaseModel):
+    source: str
+    target: str
+    weight: int
+    type: str
+
+class GraphStats(BaseModel):
+    total_nodes: int
+    total_edges: int
+    suspicious_connections: int
+
+class GraphData(BaseModel):
+    nodes: List[GraphNode]
+    edges: List[GraphEdge]
+    stats: GraphStats
+    timestamp: float
+
+# --- Response Caching ---
+def ttl_cache(ttl: float):
+    """Cache a function's result per (hashable) argument tuple for `ttl` seconds"""
+    def decorator(func):
+        # args -> (expires, value); meant for a handful of long-lived arguments
+        cache = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            entry = cache.get(args)
+            if entry is None or now >= entry[0]:
+                entry = (now + ttl, func(*args))
+                cache[args] = entry
+            return entry[1]
+        return wrapper
+    return decorator
 
 # --- Application Setup ---
 app = FastAPI(
     title="NIDS Backend with Auth",
     description="NIDS backend with authentication for frontend compatibility",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration
+# Reject unauthenticated requests to protected endpoints before routing and dependency resolution
+app.add_middleware(TokenAuthMiddleware, routes=app.routes)
+
+# Compress larger JSON bodies (graph, test results); small ones like /api/health stay raw
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
+# CORS configuration: local dev frontends only (Vite on 5173, CRA-style on 3000/3001).
+# An explicit origin pattern rather than "*", since credentials are allowed.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1):(3000|3001|5173)$",
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # let browsers cache preflight results for a day
 )
 
-# Initialize minimal ML services
-ml_services = get_ml_services()
-print(f"[*] ML Services initialized with authentication")
-
 # --- Authentication Endpoints ---
 
 @app.post("/token", summary="User Login")
@@ -84,7 +280,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me", summary="Get Current User")
-async def read_users_me(current_user: dict = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser):
     """Get current user information"""
     return {
         "username": current_user["username"],
@@ -93,129 +289,153 @@ async def read_users_me(current_user: dict = Depends(get_current_user)):
 
 # --- API Endpoints ---
 
+# Static API description, encoded once at import
+ROOT_RESPONSE = orjson.dumps({
+    "message": "NIDS Backend with Authentication",
+    "version": "1.0.0",
+    "status": "operational",
+    "description": "Windows-compatible NIDS with authentication and rule-based detection",
+    "auth_info": {
+        "demo_username": "admin",
+        "demo_password": "admin123"
+    },
+    "endpoints": ["/docs", "/api/health", "/api/ml/status", "/api/ml/test", "/token"]
+})
+
 @app.get("/", summary="API Root")
 async def read_root():
     """Root endpoint with API information"""
-    return {
-        "message": "NIDS Backend with Authentication",
-        "version": "1.0.0",
-        "status": "operational",
-        "description": "Windows-compatible NIDS with authentication and rule-based detection",
-        "auth_info": {
-            "demo_username": "admin",
-            "demo_password": "admin123"
-        },
-        "endpoints": ["/docs", "/api/health", "/api/ml/status", "/api/ml/test", "/token"]
-    }
+    return Response(content=ROOT_RESPONSE, media_type="application/json")
+
+# Static part of the health response; only the timestamp changes per call
+HEALTH_STATUS = {
+    "status": "healthy",
+    "service_type": "minimal_with_auth",
+    "platform": "windows_compatible"
+}
+
+# Encoded once with the timestamp key left open, so a probe only encodes one float
+HEALTH_PREFIX = orjson.dumps(HEALTH_STATUS)[:-1] + b',"timestamp":'
 
 @app.get("/api/health", summary="Health Check")
 async def health_check():
     """Health check endpoint"""
+    return Response(
+        content=HEALTH_PREFIX + orjson.dumps(time.time()) + b"}",
+        media_type="application/json"
+    )
+
+def get_services(request: Request):
+    """ML services created in startup_event; 503 until they exist"""
+    services = getattr(request.app.state, "ml_services", None)
+    if services is None:
+        raise HTTPException(status_code=503, detail="ML services are not initialized yet")
+    return services
+
+@ttl_cache(2.0)
+def _model_info(services):
+    """Detector/model info shared by /api/ml/status and /api/stats (refreshed every 2s)"""
+    return services.get_model_info()
+
+def _ml_status_payload(services):
+    """Build the ML status payload (model info is the only cached part)"""
     return {
-        "status": "healthy",
-        "timestamp": asyncio.get_event_loop().time(),
-        "service_type": "minimal_with_auth",
-        "platform": "windows_compatible"
+        "ml_available": False,
+        "service_type": "minimal_rule_based",
+        "models": get_model_status(),
+        "model_info": _model_info(services),
+        "timestamp": time.time()
     }
 
 @app.get("/api/ml/status", summary="ML Services Status")
-async def get_ml_status():
+async def get_ml_status(request: Request):
     """Get ML services status and capabilities"""
     try:
-        model_status = get_model_status()
-        model_info = ml_services.get_model_info()
-        
-        return {
-            "ml_available": False,
-            "service_type": "minimal_rule_based",
-            "models": model_status,
-            "model_info": model_info,
-            "timestamp": asyncio.get_event_loop().time()
-        }
+        return _ml_status_payload(get_services(request))
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "error": str(e),
             "ml_available": False,
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": time.time()
         }
 
 @app.post("/api/ml/predict", dependencies=[Depends(get_current_user)], summary="Anomaly Prediction")
-async def predict_anomaly(feature_data: Dict[str, Any]):
+async def predict_anomaly(packet: PredictRequest, request: Request):
     """Predict anomaly using rule-based detection (requires auth)"""
+    # Only the fields the client sent, so the detector sees the same dict as before
+    feature_data = packet.model_dump(exclude_unset=True)
+    services = get_services(request)
     try:
-        prediction = await ml_services.predict_anomaly(feature_data)
+        prediction = await services.predict_anomaly(feature_data)
         return {
             "prediction": prediction,
             "input_features": feature_data,
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": time.time()
         }
     except Exception as e:
         return {
             "error": str(e),
             "input_features": feature_data,
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": time.time()
         }
 
-@app.get("/api/ml/test", summary="Test Detection")
-async def test_detection():
-    """Test anomaly detection with sample data (no auth required)"""
-    test_cases = [
-        {
-            "name": "normal_http",
-            "data": {
-                'packet_size': 500,
-                'protocol': 'TCP',
-                'port': 80,
-                'time_delta': 0.1
-            }
-        },
-        {
-            "name": "large_packet",
-            "data": {
-                'packet_size': 1500,
-                'protocol': 'TCP',
-                'port': 443,
-                'time_delta': 0.05
-            }
-        },
-        {
-            "name": "suspicious_port",
-            "data": {
-                'packet_size': 200,
-                'protocol': 'TCP',
-                'port': 1337,
-                'time_delta': 0.001
-            }
+# Fixed sample packets for /api/ml/test
+TEST_CASES = (
+    {
+        "name": "normal_http",
+        "data": {
+            'packet_size': 500,
+            'protocol': 'TCP',
+            'port': 80,
+            'time_delta': 0.1
+        }
+    },
+    {
+        "name": "large_packet",
+        "data": {
+            'packet_size': 1500,
+            'protocol': 'TCP',
+            'port': 443,
+            'time_delta': 0.05
+        }
+    },
+    {
+        "name": "suspicious_port",
+        "data": {
+            'packet_size': 200,
+            'protocol': 'TCP',
+            'port': 1337,
+            'time_delta': 0.001
         }
-    ]
-    
-    results = []
-    
-    for test_case in test_cases:
-        try:
-            prediction = await ml_services.predict_anomaly(test_case["data"])
-            results.append({
-                "test_case": test_case["name"],
-                "input": test_case["data"],
-                "prediction": prediction,
-                "status": "success"
-            })
-        except Exception as e:
-            results.append({
-                "test_case": test_case["name"],
-                "input": test_case["data"],
-                "error": str(e),
-                "status": "failed"
-            })
-    
-    return {
-        "test_results": results,
-        "timestamp": asyncio.get_event_loop().time()
     }
+)
 
-@app.get("/api/alerts", dependencies=[Depends(get_current_user)], summary="Security Alerts")
-async def get_alerts():
-    """Get simulated security alerts (requires auth)"""
+# Constant part of each test result, encoded once; only the prediction is spliced in per request
+TEST_RESULT_PREFIXES = tuple(
+    orjson.dumps({"test_case": test_case["name"], "input": test_case["data"]})[:-1] + b',"prediction":'
+    for test_case in TEST_CASES
+)
+
+@app.get("/api/ml/test", summary="Test Detection")
+async def test_detection(request: Request):
+    """Test anomaly detection with sample data (no auth required)"""
+    # Score all cases in one batched detector call
+    predictions = await get_services(request).predict_anomaly_batch([test_case["data"] for test_case in TEST_CASES])
+    results = b",".join(
+        prefix + orjson.dumps(prediction) + b',"status":"success"}'
+        for prefix, prediction in zip(TEST_RESULT_PREFIXES, predictions)
+    )
+    
+    return Response(
+        content=b'{"test_results":[' + results + b'],"timestamp":' + orjson.dumps(time.time()) + b"}",
+        media_type="application/json"
+    )
+
+def build_alerts():
+    """Build the simulated alerts payload shared by /api/alerts and /ws"""
+    now = time.time()
     return {
         "alerts": [
             {
@@ -223,150 +443,312 @@ async def get_alerts():
                 "type": "rule_based_detection",
                 "severity": "medium",
                 "message": "Suspicious traffic pattern detected",
-                "timestamp": asyncio.get_event_loop().time()
+                "timestamp": now
             },
             {
                 "id": 2,
                 "type": "port_scan",
                 "severity": "high",
                 "message": "Potential port scan detected from suspicious IP",
-                "timestamp": asyncio.get_event_loop().time() - 300
+                "timestamp": now - 300
             }
         ],
         "count": 2,
-        "timestamp": asyncio.get_event_loop().time()
+        "timestamp": now
+    }
+
+@app.get("/api/alerts", dependencies=[Depends(get_current_user)], response_model=AlertsResponse, summary="Security Alerts")
+async def get_alerts():
+    """Get simulated security alerts (requires auth)"""
+    # Encoded in one orjson call; the payload is plain JSON types, so no jsonable_encoder pass
+    return Response(content=orjson.dumps(build_alerts()), media_type="application/json")
+
+# Mock network graph, built once and shared by /api/graph/data, /api/graph and /ws.
+# Bump GRAPH_VERSION whenever GRAPH_SNAPSHOT changes so /ws clients re-receive it.
+GRAPH_VERSION = 1
+GRAPH_SNAPSHOT = {
+    "nodes": [
+        {"id": "192.168.1.1", "type": "host", "connections": 5, "label": "Gateway"},
+        {"id": "192.168.1.2", "type": "host", "connections": 3, "label": "Workstation"},
+        {"id": "192.168.1.100", "type": "host", "connections": 1, "label": "Server"},
+        {"id": "10.0.0.1", "type": "external", "connections": 2, "label": "External"}
+    ],
+    "edges": [
+        {"source": "192.168.1.1", "target": "192.168.1.2", "weight": 10, "type": "normal"},
+        {"source": "192.168.1.1", "target": "192.168.1.100", "weight": 5, "type": "normal"},
+        {"source": "192.168.1.2", "target": "10.0.0.1", "weight": 3, "type": "suspicious"}
+    ],
+    "stats": {
+        "total_nodes": 4,
+        "total_edges": 3,
+        "suspicious_connections": 1
     }
+}
 
-@app.get("/api/graph/data", dependencies=[Depends(get_current_user)], summary="Graph Data")
+@app.get("/api/graph/data", dependencies=[Depends(get_current_user)], response_model=GraphData, summary="Graph Data")
 async def get_graph_data():
     """Get mock network graph data (requires auth)"""
     return {
-        "nodes": [
-            {"id": "192.168.1.1", "type": "host", "connections": 5, "label": "Gateway"},
-            {"id": "192.168.1.2", "type": "host", "connections": 3, "label": "Workstation"},
-            {"id": "192.168.1.100", "type": "host", "connections": 1, "label": "Server"},
-            {"id": "10.0.0.1", "type": "external", "connections": 2, "label": "External"}
-        ],
-        "edges": [
-            {"source": "192.168.1.1", "target": "192.168.1.2", "weight": 10, "type": "normal"},
-            {"source": "192.168.1.1", "target": "192.168.1.100", "weight": 5, "type": "normal"},
-            {"source": "192.168.1.2", "target": "10.0.0.1", "weight": 3, "type": "suspicious"}
-        ],
-        "stats": {
-            "total_nodes": 4,
-            "total_edges": 3,
-            "suspicious_connections": 1
-        },
-        "timestamp": asyncio.get_event_loop().time()
+        **GRAPH_SNAPSHOT,
+        "timestamp": time.time()
     }
 
-@app.get("/api/graph", dependencies=[Depends(get_current_user)], summary="Graph Data (Alias)")
+@app.get("/api/graph", dependencies=[Depends(get_current_user)], response_model=GraphData, summary="Graph Data (Alias)")
 async def get_graph():
     """Get network graph data (alias for /api/graph/data)"""
     return await get_graph_data()
 
 @app.get("/api/stats", summary="System Stats")
-async def get_stats():
+async def get_stats(request: Request):
     """Get system statistics"""
-    model_info = ml_services.get_model_info()
+    model_info = _model_info(get_services(request))
     return {
         "system": "nids_with_auth",
         "detector_stats": model_info.get("detector_stats", {}),
         "predictions_made": model_info.get("predictions_made", 0),
         "auth_info": "Simple token-based authentication",
-        "timestamp": asyncio.get_event_loop().time()
+        "websockets": {
+            name: {
+                "clients": len(manager.active_connections),
+                "dropped_messages": manager.dropped_messages
+            }
+            for name, manager in (("alerts", alerts_manager), ("updates", updates_manager))
+        },
+        "timestamp": time.time()
     }
 
 # --- WebSocket Support ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list = []
+WS_ERROR_LOG_INTERVAL = 30.0  # seconds between log lines for the same error message
+# message -> [last logged at (monotonic), repeats suppressed since], oldest first, bounded
+_ws_error_log: "OrderedDict[str, list]" = OrderedDict()
+
+def log_ws_error(message: str):
+    """Log a WebSocket error at most once per interval per distinct message"""
+    now = time.monotonic()
+    entry = _ws_error_log.get(message)
+    if entry is not None and now - entry[0] < WS_ERROR_LOG_INTERVAL:
+        entry[1] += 1
+        return
+    suppressed = entry[1] if entry is not None else 0
+    _ws_error_log[message] = [now, 0]
+    _ws_error_log.move_to_end(message)
+    if len(_ws_error_log) > 64:
+        _ws_error_log.popitem(last=False)
+    if suppressed:
+        logger.warning("WebSocket error: %s (%d similar suppressed)", message, suppressed)
+    else:
+        logger.warning("WebSocket error: %s", message)
 
-    async def connect(self, websocket: WebSocket):
+class ConnectionManager:
+    __slots__ = (
+        "queue_size", "max_connections", "send_timeout", "active_connections",
+        "dropped_messages", "last_event", "snapshot_event"
+    )
+
+    def __init__(self, queue_size: int = 256, max_connections: int = 500, send_timeout: float = 5.0):
+        self.queue_size = queue_size
+        # Beyond this many clients new sockets are refused instead of growing memory further
+        self.max_connections = max_connections
+        # A single send stuck longer than this marks the client as dead
+        self.send_timeout = send_timeout
+        # websocket -> (outbound queue, sender task)
+        self.active_connections: Dict[WebSocket, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        self.dropped_messages = 0
+        # Most recent broadcast, replayed to new clients so they don't wait a full tick
+        self.last_event = None
+        # Most recent full-state message (e.g. the graph), replayed before last_event
+        self.snapshot_event = None
+
+    async def connect(self, websocket: WebSocket, snapshot: bool = True) -> bool:
+        if len(self.active_connections) >= self.max_connections:
+            # Complete the handshake first: a close before accept() becomes an HTTP 403,
+            # whereas 1013 ("try again later") tells the client it may retry
+            await websocket.accept()
+            await websocket.close(code=1013)
+            logger.warning("WS refused, %d connections active", len(self.active_connections))
+            return False
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if snapshot and self.snapshot_event is not None:
+            queue.put_nowait(self.snapshot_event)
+        if self.last_event is not None:
+            queue.put_nowait(self.last_event)
+        task = asyncio.create_task(self._sender(websocket, queue))
+        self.active_connections[websocket] = (queue, task)
+        logger.debug("WS connected, active=%d", len(self.active_connections))
+        return True
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        entry = self.active_connections.pop(websocket, None)
+        if entry is not None:
+            entry[1].cancel()
+            logger.debug("WS disconnected, active=%d", len(self.active_connections))
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections[:]:
+    async def _sender(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Drain one client's queue so a slow socket only delays itself"""
+        try:
+            while True:
+                event = await queue.get()
+                await asyncio.wait_for(websocket.send(event), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Failed or stalled send: stop serving this client and close it (best effort)
+            log_ws_error(f"send failed: {type(e).__name__}")
+            self.active_connections.pop(websocket, None)
             try:
-                await connection.send_text(message)
-            except:
-                self.active_connections.remove(connection)
-
-manager = ConnectionManager()
+                await asyncio.wait_for(websocket.close(code=1011), self.send_timeout)
+            except Exception:
+                pass
+
+    async def broadcast(self, message: str, snapshot: bool = False):
+        """Queue one pre-encoded message for every client without awaiting sends"""
+        # Build the ASGI send event once and share it across all sockets
+        event = {"type": "websocket.send", "text": message}
+        if snapshot:
+            self.snapshot_event = event
+        else:
+            self.last_event = event
+        for queue, _ in self.active_connections.values():
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop rather than let its backlog grow
+                self.dropped_messages += 1
+
+alerts_manager = ConnectionManager()
+updates_manager = ConnectionManager()
+
+async def alerts_pump():
+    """Build the /ws/alerts payload once per tick and fan it out to every client"""
+    while True:
+        # Send periodic alerts
+        now = time.time()
+        alert_data = {
+            "type": "alert",
+            "alerts": [
+                {
+                    "id": 1,
+                    "type": "rule_based_detection",
+                    "severity": "medium",
+                    "message": "Suspicious traffic pattern detected",
+                    "timestamp": now
+                }
+            ],
+            "timestamp": now
+        }
+        
+        await alerts_manager.broadcast(orjson.dumps(alert_data).decode())
+        await asyncio.sleep(10)  # Send updates every 10 seconds
+
+async def updates_pump():
+    """Build the /ws payload once per tick and fan it out to every client"""
+    sent_version = None
+    while True:
+        # Only send the graph when it changed; updates carry the version it applies to
+        if sent_version != GRAPH_VERSION:
+            sent_version = GRAPH_VERSION
+            graph_data = {
+                "type": "graph",
+                "graph_version": GRAPH_VERSION,
+                "graph": await get_graph_data()
+            }
+            await updates_manager.broadcast(orjson.dumps(graph_data).decode(), snapshot=True)
+        
+        # Send periodic updates
+        data = {
+            "type": "update",
+            "graph_version": GRAPH_VERSION,
+            "alerts": build_alerts()["alerts"],
+            "timestamp": time.time()
+        }
+        
+        await updates_manager.broadcast(orjson.dumps(data).decode())
+        await asyncio.sleep(5)  # Send updates every 5 seconds
 
-@app.websocket("/ws/alerts")
-async def websocket_alerts(websocket: WebSocket):
-    """WebSocket endpoint for real-time alerts"""
-    await manager.connect(websocket)
+async def serve_websocket(websocket: WebSocket, manager: ConnectionManager, snapshot: bool = True):
+    """Register a client and hold the connection open until it disconnects"""
+    if not await manager.connect(websocket, snapshot):
+        return
     try:
+        # Payloads are pushed by the shared pump; ignore inbound frames (text or binary)
+        # and only wait for the client to leave
         while True:
-            # Send periodic alerts
-            alert_data = {
-                "type": "alert",
-                "alerts": [
-                    {
-                        "id": 1,
-                        "type": "rule_based_detection",
-                        "severity": "medium",
-                        "message": "Suspicious traffic pattern detected",
-                        "timestamp": asyncio.get_event_loop().time()
-                    }
-                ],
-                "timestamp": asyncio.get_event_loop().time()
-            }
-            
-            await websocket.send_text(json.dumps(alert_data))
-            await asyncio.sleep(10)  # Send updates every 10 seconds
-            
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        log_ws_error(str(e))
+    finally:
         manager.disconnect(websocket)
 
+@app.websocket("/ws/alerts")
+async def websocket_alerts(websocket: WebSocket):
+    """WebSocket endpoint for real-time alerts"""
+    await serve_websocket(websocket, alerts_manager)
+
 @app.websocket("/ws")
-async def websocket_general(websocket: WebSocket):
-    """General WebSocket endpoint"""
-    await manager.connect(websocket)
-    try:
-        while True:
-            # Send periodic updates
-            data = {
-                "type": "update",
-                "graph": await get_graph_data(),
-                "alerts": (await get_alerts())["alerts"],
-                "timestamp": asyncio.get_event_loop().time()
-            }
-            
-            await websocket.send_text(json.dumps(data))
-            await asyncio.sleep(5)  # Send updates every 5 seconds
-            
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
+async def websocket_general(websocket: WebSocket, since_version: int = 0):
+    """General WebSocket endpoint (pass ?since_version=N to skip an unchanged graph)"""
+    await serve_websocket(websocket, updates_manager, since_version != GRAPH_VERSION)
 
 # --- Startup Event ---
+# Joined once so startup emits a single log record
+STARTUP_BANNER = "\n".join([
+    "=" * 50,
+    "🚀 NIDS Backend with Auth Starting",
+    "=" * 50,
+    "🔧 Service Type: Rule-based Detection",
+    "🔐 Authentication: Enabled (demo credentials)",
+    "👤 Demo Login: admin / admin123",
+    "🪟 Platform: Windows Compatible",
+    "🌐 Server: http://localhost:8000",
+    "📚 Docs: http://localhost:8000/docs",
+    "=" * 50,
+])
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
-    print("=" * 50)
-    print("🚀 NIDS Backend with Auth Starting")
-    print("=" * 50)
-    print("🔧 Service Type: Rule-based Detection")
-    print("🔐 Authentication: Enabled (demo credentials)")
-    print("👤 Demo Login: admin / admin123")
-    print("🪟 Platform: Windows Compatible")
-    print("🌐 Server: http://localhost:8000")
-    print("📚 Docs: http://localhost:8000/docs")
-    print("=" * 50)
+    logger.info(STARTUP_BANNER)
+    
+    # Initialize minimal ML services off the import path (and off the event loop)
+    app.state.ml_services = await asyncio.get_running_loop().run_in_executor(None, get_ml_services)
+    logger.info("[*] ML Services initialized with authentication")
+    
+    # One producer per WebSocket stream, shared by all connected clients
+    app.state.ws_pumps = [
+        asyncio.create_task(alerts_pump()),
+        asyncio.create_task(updates_pump())
+    ]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks on shutdown"""
+    for task in getattr(app.state, "ws_pumps", []):
+        task.cancel()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    # NIDS_WORKERS > 1 runs several worker processes (each with its own in-memory state);
+    # "auto" uses one per CPU core. uvicorn needs an import string rather than the app
+    # object to spawn them
+    workers_env = os.getenv("NIDS_WORKERS", "1")
+    if workers_env == "auto":
+        workers = os.cpu_count() or 1
+    else:
+        workers = int(workers_env) if workers_env.isdigit() else 0
+        if workers < 1:
+            raise SystemExit(f"NIDS_WORKERS must be a positive integer or 'auto', got {workers_env!r}")
+    # Per-request access lines are formatted and written synchronously; opt in with NIDS_ACCESS_LOG=1
+    access_log = os.getenv("NIDS_ACCESS_LOG", "0") == "1"
+    # Broadcast frames are shared by all clients; skip per-client deflate
+    uvicorn.run(
+        app if workers == 1 else "main_ml_with_auth:app",
+        host="0.0.0.0",
+        port=8000,
+        log_level="info",
+        workers=workers,
+        access_log=access_log,
+        ws_per_message_deflate=False
+    )
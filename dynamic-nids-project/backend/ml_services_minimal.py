@@ -11,6 +11,7 @@ import os
 import json
 from typing import Dict, Optional, Any, List
 from datetime import datetime
+from collections import deque
 
 # Import our numpy-free detector
 from simple_detector_nonumpy import SimpleAnomalyDetector
@@ -25,7 +26,8 @@ class MLServicesMinimal:
         self.models_dir = models_dir
         self.ml_available = False  # No advanced ML
         self.detector = SimpleAnomalyDetector()
-        self.prediction_history = []
+        # Keep only recent predictions
+        self.prediction_history = deque(maxlen=100)
         print("[*] Minimal ML Services initialized (Windows-compatible)")
     
     async def predict_anomaly(self, feature_vector: Dict) -> Optional[Dict]:
@@ -52,21 +54,51 @@ class MLServicesMinimal:
                 'prediction': prediction
             })
             
-            # Keep only recent predictions
-            if len(self.prediction_history) > 100:
-                self.prediction_history = self.prediction_history[-100:]
-            
             return prediction
             
         except Exception as e:
             print(f"[!] Prediction error: {e}")
-            return {
-                'is_anomaly': False,
-                'anomaly_score': 0.0,
-                'confidence': 0.0,
-                'reasoning': [f'Error: {str(e)}'],
-                'detector_type': 'error'
-            }
+            return self._error_result(e)
+    
+    async def predict_anomaly_batch(self, feature_vectors: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Predict anomalies for several feature vectors in one detector call
+        
+        Args:
+            feature_vectors: List of packet feature dictionaries
+            
+        Returns:
+            List of prediction results, in input order
+        """
+        try:
+            predictions = await self.detector.predict_batch(feature_vectors)
+            
+            # Store prediction history (one timestamp for the whole batch)
+            timestamp = datetime.now().isoformat()
+            self.prediction_history.extend(
+                {'timestamp': timestamp, 'features': feature_vector, 'prediction': prediction}
+                for feature_vector, prediction in zip(feature_vectors, predictions)
+                if feature_vector
+            )
+            
+            return [
+                prediction if feature_vector else None
+                for feature_vector, prediction in zip(feature_vectors, predictions)
+            ]
+            
+        except Exception as e:
+            print(f"[!] Batch prediction error: {e}")
+            return [self._error_result(e) for _ in feature_vectors]
+    
+    def _error_result(self, error: Exception) -> Dict:
+        """Prediction returned when detection fails"""
+        return {
+            'is_anomaly': False,
+            'anomaly_score': 0.0,
+            'confidence': 0.0,
+            'reasoning': [f'Error: {str(error)}'],
+            'detector_type': 'error'
+        }
     
     def get_model_info(self) -> Dict:
         """Get information about available models"""
@@ -9,6 +9,7 @@ import json
 import random
 import time
 import math
+from collections import deque
 
 class SimpleAnomalyDetector:
     """
@@ -17,7 +18,10 @@ class SimpleAnomalyDetector:
     """
     
     def __init__(self):
-        self.packet_history = []
+        # Bounded history: appends evict the oldest packet in O(1)
+        self.packet_history = deque(maxlen=1000)
+        # (src_ip, port) of the last 10 packets, extracted once on insert for scan checks
+        self.scan_window = deque(maxlen=10)
         self.baseline_stats = {
             'avg_packet_size': 500,
             'std_packet_size': 200,
@@ -37,18 +41,55 @@ class SimpleAnomalyDetector:
             dict: Prediction results
         """
         if not feature_vector:
-            return {
-                'is_anomaly': False,
-                'anomaly_score': 0.0,
-                'confidence': 0.0,
-                'reasoning': ['No data provided']
-            }
+            return self._empty_result()
             
         # Store packet for statistical analysis
-        self.packet_history.append(feature_vector)
-        if len(self.packet_history) > 1000:  # Keep only recent packets
-            self.packet_history = self.packet_history[-1000:]
+        self._remember(feature_vector)
+        
+        return self._analyze(feature_vector)
+    
+    async def predict_batch(self, feature_vectors):
+        """
+        Analyze several packets in one call.
         
+        Each packet is scored exactly as in predict(), without a
+        coroutine round-trip per packet.
+        
+        Args:
+            feature_vectors (list): List of packet feature dicts
+            
+        Returns:
+            list: Prediction results, in the same order as the input
+        """
+        results = []
+        for feature_vector in feature_vectors:
+            if not feature_vector:
+                results.append(self._empty_result())
+                continue
+            self._remember(feature_vector)
+            results.append(self._analyze(feature_vector))
+        
+        return results
+    
+    def _remember(self, feature_vector):
+        """Store a packet in the history and the port-scan window"""
+        self.packet_history.append(feature_vector)
+        self.scan_window.append((
+            feature_vector.get('src_ip'),
+            feature_vector.get('port', feature_vector.get('dst_port'))
+        ))
+    
+    def _empty_result(self):
+        """Result returned when no features are provided"""
+        return {
+            'is_anomaly': False,
+            'anomaly_score': 0.0,
+            'confidence': 0.0,
+            'reasoning': ['No data provided']
+        }
+    
+    def _analyze(self, feature_vector):
+        """Score a single packet that is already stored in the history"""
         # Rule-based anomaly detection
         anomaly_score = 0
         anomaly_reasons = []
@@ -113,19 +154,13 @@ class SimpleAnomalyDetector:
             return False
         
         # Check for multiple different destination ports from same source
-        recent_packets = self.packet_history[-10:]
         src_ip = feature_vector.get('src_ip', '')
         
         if not src_ip:
             return False
         
         # Count unique destination ports from this source
-        ports = set()
-        for packet in recent_packets:
-            if packet.get('src_ip') == src_ip:
-                port = packet.get('port', packet.get('dst_port'))
-                if port:
-                    ports.add(port)
+        ports = {port for ip, port in self.scan_window if ip == src_ip and port}
         
         # If more than 5 different ports in recent history, likely scanning
         return len(ports) > 5
@@ -23,6 +23,7 @@ echo Installing FastAPI and related...
 pip install fastapi==0.104.1
 pip install "uvicorn[standard]==0.24.0"
 pip install python-multipart==0.0.6
+pip install orjson==3.9.10
 
 echo Installing authentication packages...
 pip install "python-jose[cryptography]==3.3.0"